@@ -1,294 +1,530 @@
-"""
-Script Name: vuams_serial.py
-Description: This script facilitates communication with a VU-AMS device via USB infrared bridge, allowing for operations such as checking device presence, syncing time, starting/stopping recording, and sending markers. It utilizes the pySerial library for serial communication and supports command-line interaction for ease of use.
-Author: nixmo (nixmo@posteo.de)
-Version: 1.0
-Date: 2024-02-01
-License: MIT License
-GitHub: https://github.com/nixmo/python_vuams
-Dependencies: pySerial (https://pyserial.readthedocs.io/en/latest/pyserial.html)
-Usage: Run this script with command-line arguments to interact with the VU-AMS device. Use '--help' to list all available options. Example: `python vuams_serial.py --port COM5 --status`. Alternatively, you can import the AmsDevice class from this script, initialize an instance of the device, and call the methods of the class directly. For examples see the readme on the github repository.
-Note: This is an unofficial script not supported by the Vrije Universiteit Amsterdam. Ensure the AMS device is connected via the USB infrared bridge and the VU-DAMS software and the CDM_v2.10.00_WHQL_Certified driver are installed before running this script (https://vu-ams.nl/downloads/).
-"""
-
-import serial
-from serial.tools import list_ports
-import time
-import zlib
-import datetime
-import argparse
-from sys import exit
-
-class AmsDevice:
-    status_labels = {
-        1: "No Memory",
-        2: "Close Cover",
-        3: "Idle",
-        4: "Recording",
-        5: "Memory Full",
-        6: "Battery Low"
-    }
-
-    def __init__(self, port_name, baudrate=38400, bytesize=8, stopbits=1, parity='N', timeout=0, write_timeout=0):
-        self.isConnected = False
-        self.serialPort = None
-        self.port_name = port_name
-        self.baudrate = baudrate
-        self.bytesize = bytesize
-        self.stopbits = stopbits
-        self.parity = parity
-        self.timeout = timeout
-        self.write_timeout = write_timeout
-
-    @staticmethod
-    def find_device_port():
-        ports = list_ports.comports()
-        for port in ports:
-            try:
-                # pyserial represents vendor and product id in decimal by default - we convert to hexadecimal to follow convention used by node js serialport package
-                vid_hex = f"{port.vid:04X}"
-                pid_hex = f"{port.pid:04X}"
-
-                if (port.description == f"USB Serial Port ({port.device})" and
-                    # port.vid == 1027 and
-                    # port.pid == 24577 and
-                    vid_hex == "0403" and
-                    pid_hex == "6001" and
-                    port.manufacturer == "FTDI"):
-                    return port.device
-            except:
-                pass
-        return None
-
-    def connect(self):
-        try:
-            self.serialPort = serial.Serial(
-                port=self.port_name,
-                baudrate=self.baudrate,
-                bytesize=self.bytesize,
-                stopbits=self.stopbits,
-                parity=self.parity,
-                timeout=self.timeout,
-                write_timeout=self.write_timeout
-            )
-        except serial.serialutil.SerialException as e:
-            print(f"Error occured while trying to open port {self.port_name}: {e}")
-            return False
-
-        r = self.is_device_present()
-        if r:
-            self.isConnected = True
-            return True
-        self.disconnect()
-        return False
-
-    def disconnect(self):
-        if self.serialPort:
-            self.serialPort.close()
-        self.isConnected = False
-
-    def send_packet(self, packet):
-        # Convert packet to bytes
-        byte_packet = bytearray([(p + 256) % 256 for p in packet])
-        
-        # Calculate CRC32
-        crc = zlib.crc32(byte_packet) & 0xFFFFFFFF
-        crc_bytes = bytearray([(crc >> (8 * i)) & 0xFF for i in range(4)])  # big-endian order
-        
-        # Append CRC bytes to the packet
-        byte_packet.extend(crc_bytes)
-        
-        try:
-            self.serialPort.write(byte_packet)
-        except serial.SerialException as e:
-            print(f"Serial port exception: {e}")
-        except Exception as e:
-            print(f"Exception occurred while sending packet: {e}")
-    
-    def receive_packet(self, timeout=3):
-        end_time = time.time() + timeout  # Calculate when we should stop (current time + timeout seconds)
-        data_received = None
-        try:
-            while True:
-                if time.time() > end_time:
-                    print("Timeout exceeded, exiting receive mode...")
-                    break
-
-                if self.serialPort.in_waiting > 0:
-                    data = self.serialPort.read(self.serialPort.in_waiting)
-                    data_received = data
-                    break
-
-                time.sleep(0.1)
-        except KeyboardInterrupt:
-            print("Exiting receive mode...")
-        finally:
-            return data_received
-    
-    # checks if the VU-AMS device is present on this port by looking for a specific, hardcoded response via serial
-    def is_device_present(self):
-        try:
-            data = self.get_parameter_from_device(200)
-            if data and isinstance(data, (bytes, bytearray)):
-                data_list = [int(byte) for byte in data]
-                if data_list[:8] == [12, 0, 129, 200, 65, 77, 83, 50]:
-                    return True
-        except:
-            return False
-    
-    def start_recording(self):
-        self.send_command(5)
-
-    def stop_recording(self):
-        self.send_command(6)
-    
-    def get_device_status(self, string=False):
-        data = self.get_parameter_from_device(100)
-        if data is None:
-            return None
-        data_list = [int(byte) for byte in data]
-        status = data_list[4]
-        if not string:
-            return status
-        else:
-            return self.status_labels[status]
-
-    def get_device_label(self):
-        data = self.get_parameter_from_device(202)
-        if data is None:
-            return None
-        data_list = [int(byte) for byte in data]
-        device_label = str(data_list[4])
-        return device_label
-
-    def get_parameter_from_device(self, par):
-        # get_parameter_from_device(100) - status
-        # get_parameter_from_device(109) - battery voltage in unknown units
-        # get_parameter_from_device(200) - will return 8 specific bytes if device is present
-        # get_parameter_from_device(201) - version
-        # get_parameter_from_device(202) - "device label" (serial number)
-        # There are more. I have not tested all.
-
-        b = [8, 0, 1, par]
-        self.send_packet(b)
-        r = self.receive_packet()
-        return r
-        
-    def sync_time(self):
-        dt = datetime.datetime.now()
-        isdst = int(time.localtime().tm_isdst)
-        
-        time_array = [
-            dt.year - 1900,
-            dt.month - 1,  # device expects java convention month numbering (0-11)
-            dt.day,
-            dt.hour,
-            dt.minute,
-            dt.second,
-            isdst,
-            dt.weekday() + 1
-        ]
-
-        # Prepend the protocol specific header information
-        b = [8 + len(time_array), 0, 6, 0] + time_array
-
-        # Send the packet with the time information
-        self.send_packet(b)
-
-        # Receive the response packet
-        r = self.receive_packet()
-        if r is not None:
-            return True
-        return False
-
-    def send_command(self, com):
-        b = [8, 0, 11, com]
-        self.send_packet(b)
-        r = self.receive_packet()
-        if r:
-            return True
-        else:
-            return False
-    
-    def send_marker(self, s):
-        s = str(s)
-        # Truncate input to 32 characters and replace non-ASCII characters
-        s = s[:32].encode('ascii', 'replace').decode()
-        s = s.replace('?', '_')  # Replace the replacement character with underscore
-
-        b = [0] * 52  # Initialize an array of 52 zeros
-
-        # Set specific positions to certain values
-        b[0] = 56
-        b[2] = 14
-        b[4] = 3
-        b[6] = 48
-        b[8] = 17
-        b[9] = 17
-        b[10] = 17
-        b[11] = 17
-        b[12] = 1
-        b[16] = 4
-
-        # Fill with ASCII values of the characters in the string
-        for j in range(20, 20 + len(s)):
-            b[j] = ord(s[j - 20])  # Use ord to get ASCII value of character
-
-        # Send the packet
-        self.send_packet(b)
-
-
-def main():
-    parser = argparse.ArgumentParser(description='Interact with a VU-AMS device connected to the computer via the AMS USB infared bridge.')
-    parser.add_argument('--port', help='Set a specific port (e.g. COM5). If not set, port will be determined automatically', type=str)
-    exclusive_group = parser.add_mutually_exclusive_group(required=True)
-    exclusive_group.add_argument('--device-present', action='store_true', help='Check if device is present')
-    exclusive_group.add_argument('--label', action='store_true', help='Get device label (serial number)')
-    exclusive_group.add_argument('--status', action='store_true', help='Get device status')
-    exclusive_group.add_argument('--status-integer', action='store_true', help='Get device status as an integer')
-    exclusive_group.add_argument('--sync-time', action='store_true', help='Set device time to system time')
-    exclusive_group.add_argument('--start-recording', action='store_true', help='Start recording')
-    exclusive_group.add_argument('--stop-recording', action='store_true', help='Stop recording')
-    exclusive_group.add_argument('--send-marker', metavar='MARKER', help='Send marker MARKER', type=str)
-
-    args = parser.parse_args()
-
-    # If port is not specified, find it automatically
-    port = args.port if args.port else AmsDevice.find_device_port()
-    if not port:
-        print("Could not find a compatible device port automatically.")
-        exit(1)
-
-    # Instantiate the device with the selected port
-    device = AmsDevice(port)
-    if device.connect():
-        try:
-            if args.device_present:
-                device_present = device.is_device_present()
-                print(f'{port},{device_present}')
-            elif args.label:
-                device_label = device.get_device_label()
-                print(f'{port},{device_label}')
-            elif args.status:
-                status = device.get_device_status(True)
-                print(f'{port},{status}')
-            elif args.status_integer:
-                status = device.get_device_status()
-                print(f'{port},{status}')
-            elif args.sync_time:
-                device.sync_time()
-            elif args.start_recording:
-                device.start_recording()
-            elif args.stop_recording:
-                device.stop_recording()
-            elif args.send_marker:
-                device.send_marker(args.send_marker)
-        finally:
-            device.disconnect()
-            exit(0)
-    else:
-        print("Failed to connect to the device.")
-        exit(1)
-
-if __name__ == '__main__':
-    main()
+"""
+Script Name: vuams_serial.py
+Description: This script facilitates communication with a VU-AMS device via USB infrared bridge, allowing for operations such as checking device presence, syncing time, starting/stopping recording, and sending markers. It utilizes the pySerial library for serial communication and supports command-line interaction for ease of use.
+Author: nixmo (nixmo@posteo.de)
+Version: 1.0
+Date: 2024-02-01
+License: MIT License
+GitHub: https://github.com/nixmo/python_vuams
+Dependencies: pySerial (https://pyserial.readthedocs.io/en/latest/pyserial.html)
+Usage: Run this script with command-line arguments to interact with the VU-AMS device. Use '--help' to list all available options. Example: `python vuams_serial.py --port COM5 --status`. Alternatively, you can import the AmsDevice class from this script, initialize an instance of the device, and call the methods of the class directly. For examples see the readme on the github repository.
+Note: This is an unofficial script not supported by the Vrije Universiteit Amsterdam. Ensure the AMS device is connected via the USB infrared bridge and the VU-DAMS software and the CDM_v2.10.00_WHQL_Certified driver are installed before running this script (https://vu-ams.nl/downloads/).
+"""
+
+import serial
+from serial.tools import list_ports
+import asyncio
+import os
+import socket
+import struct
+import tempfile
+import time
+import zlib
+import datetime
+import argparse
+from sys import exit
+
+# Device status values are small consecutive ints (1..6), so a tuple indexed
+# by status is cheaper than a dict lookup; slot 0 is unused
+STATUS_LABELS = (
+    None,
+    "No Memory",
+    "Close Cover",
+    "Idle",
+    "Recording",
+    "Memory Full",
+    "Battery Low"
+)
+
+# Fixed 52-byte header for marker packets; the ASCII payload is spliced in at
+# offset 20 by send_marker
+_MARKER_TEMPLATE = bytearray(52)
+_MARKER_TEMPLATE[0] = 56
+_MARKER_TEMPLATE[2] = 14
+_MARKER_TEMPLATE[4] = 3
+_MARKER_TEMPLATE[6] = 48
+_MARKER_TEMPLATE[8:12] = b'\x11\x11\x11\x11'
+_MARKER_TEMPLATE[12] = 1
+_MARKER_TEMPLATE[16] = 4
+_MARKER_TEMPLATE = bytes(_MARKER_TEMPLATE)
+
+
+def _time_packet():
+    # Packet that sets the device clock to the current system time: the
+    # protocol header (length, 0, 6, 0) followed by the 8 time fields
+    dt = datetime.datetime.now()
+    isdst = int(time.localtime().tm_isdst)
+    return struct.pack(
+        '12B',
+        8 + 8, 0, 6, 0,
+        dt.year - 1900,
+        dt.month - 1,  # device expects java convention month numbering (0-11)
+        dt.day,
+        dt.hour,
+        dt.minute,
+        dt.second,
+        isdst,
+        dt.weekday() + 1
+    )
+
+
+def _frame(packet):
+    # Wire frame for a packet: payload bytes followed by the little-endian
+    # CRC32, built in a single concatenation. zlib.crc32 uses the hardware
+    # CRC folding path when CPython is linked against zlib >= 1.2.12 or
+    # zlib-ng (see README), so the checksum is never the bottleneck here.
+    buf = packet if isinstance(packet, (bytes, bytearray)) else bytes(packet)
+    return buf + zlib.crc32(buf).to_bytes(4, 'little')
+
+
+class AmsDevice:
+    def __init__(self, port_name, baudrate=38400, bytesize=8, stopbits=1, parity='N', timeout=3, write_timeout=0):
+        self.isConnected = False
+        self.serialPort = None
+        self.port_name = port_name
+        self.baudrate = baudrate
+        self.bytesize = bytesize
+        self.stopbits = stopbits
+        self.parity = parity
+        self.timeout = timeout
+        self.write_timeout = write_timeout
+
+    @staticmethod
+    def find_device_port():
+        ports = list_ports.comports()
+        for port in ports:
+            try:
+                # Cheapest checks first: compare VID/PID as the integers
+                # pyserial already provides (0x0403/0x6001 = FTDI FT232)
+                if port.vid != 0x0403 or port.pid != 0x6001:
+                    continue
+                if port.manufacturer != "FTDI":
+                    continue
+                return port.device
+            except (AttributeError, TypeError):
+                continue  # ports with no USB metadata report vid/pid as None
+        return None
+
+    # best-effort: set the FTDI latency timer from its 16 ms default down to
+    # 1 ms, so short responses leave the chip immediately instead of waiting
+    # for the timer to expire. Failure (no permissions, driver not FTDI, D2XX
+    # not installed) is harmless - the default latency simply remains.
+    def _reduce_ftdi_latency(self):
+        try:
+            if os.name == 'posix':
+                # e.g. /sys/bus/usb-serial/devices/ttyUSB0/latency_timer
+                sysfs_path = f"/sys/bus/usb-serial/devices/{os.path.basename(self.port_name)}/latency_timer"
+                with open(sysfs_path, 'w') as f:
+                    f.write('1')
+            elif os.name == 'nt':
+                import ctypes
+                ftd2xx = ctypes.WinDLL('ftd2xx')
+                count = ctypes.c_ulong()
+                if ftd2xx.FT_CreateDeviceInfoList(ctypes.byref(count)) != 0:
+                    return
+                # The latency timer is a persistent driver setting, so only
+                # touch the device whose COM port is the one we are about to
+                # open - not whatever FTDI adapter happens to enumerate first
+                for index in range(count.value):
+                    handle = ctypes.c_void_p()
+                    if ftd2xx.FT_Open(index, ctypes.byref(handle)) != 0:
+                        continue
+                    com_port = ctypes.c_long()
+                    if (ftd2xx.FT_GetComPortNumber(handle, ctypes.byref(com_port)) == 0
+                            and com_port.value > 0
+                            and f"COM{com_port.value}" == self.port_name.upper()):
+                        ftd2xx.FT_SetLatencyTimer(handle, 1)
+                        ftd2xx.FT_Close(handle)
+                        break
+                    ftd2xx.FT_Close(handle)
+        except OSError:
+            pass
+
+    def connect(self):
+        # Must happen before the port is opened: the D2XX interface on Windows
+        # cannot open the device while the VCP driver has it
+        self._reduce_ftdi_latency()
+        try:
+            self.serialPort = serial.Serial(
+                port=self.port_name,
+                baudrate=self.baudrate,
+                bytesize=self.bytesize,
+                stopbits=self.stopbits,
+                parity=self.parity,
+                timeout=self.timeout,
+                write_timeout=self.write_timeout
+            )
+        except serial.serialutil.SerialException as e:
+            print(f"Error occured while trying to open port {self.port_name}: {e}")
+            return False
+
+        # On Windows, enlarge the driver-side buffers so a response arrives in
+        # one kernel->user copy instead of USB-frame-sized fragments
+        # (set_buffer_size only exists on the win32 Serial implementation)
+        if hasattr(self.serialPort, 'set_buffer_size'):
+            self.serialPort.set_buffer_size(rx_size=65536, tx_size=65536)
+
+        r = self.is_device_present()
+        if r:
+            self.isConnected = True
+            return True
+        self.disconnect()
+        return False
+
+    def disconnect(self):
+        if self.serialPort:
+            self.serialPort.close()
+        self.isConnected = False
+
+    def send_packet(self, packet):
+        try:
+            self.serialPort.write(_frame(packet))
+        except serial.SerialException as e:
+            print(f"Serial port exception: {e}")
+        except Exception as e:
+            print(f"Exception occurred while sending packet: {e}")
+    
+    def receive_packet(self, timeout=3):
+        data_received = None
+        try:
+            # Block in the OS until at least one byte arrives (or the timeout
+            # expires), then drain whatever else is already buffered
+            self.serialPort.timeout = timeout
+            data = self.serialPort.read(1)
+            if data:
+                data += self.serialPort.read(self.serialPort.in_waiting)
+                data_received = data
+            else:
+                print("Timeout exceeded, exiting receive mode...")
+        except KeyboardInterrupt:
+            print("Exiting receive mode...")
+        finally:
+            return data_received
+
+    # reads exactly nbytes (a fixed-format device response), blocking until the
+    # frame is complete or the timeout expires; avoids racing in_waiting against
+    # a partially arrived frame
+    def receive_frame(self, nbytes, timeout=3):
+        self.serialPort.timeout = timeout
+        return self.serialPort.read(nbytes)
+
+    # checks if the VU-AMS device is present on this port by looking for a specific, hardcoded response via serial
+    def is_device_present(self):
+        try:
+            data = self.get_parameter_from_device(200, response_length=16)
+            if data and isinstance(data, (bytes, bytearray)):
+                if data[:8] == b'\x0c\x00\x81\xc8AMS2':
+                    return True
+        except (serial.SerialException, IndexError):
+            return False
+    
+    def start_recording(self):
+        self.send_command(5)
+
+    def stop_recording(self):
+        self.send_command(6)
+    
+    def get_device_status(self, string=False):
+        data = self.get_parameter_from_device(100, response_length=16)
+        if not data:
+            return None
+        status = data[4]
+        if not string:
+            return status
+        else:
+            return STATUS_LABELS[status]
+
+    def get_device_label(self):
+        data = self.get_parameter_from_device(202)
+        if data is None:
+            return None
+        device_label = str(data[4])
+        return device_label
+
+    def get_parameter_from_device(self, par, response_length=None):
+        # get_parameter_from_device(100) - status
+        # get_parameter_from_device(109) - battery voltage in unknown units
+        # get_parameter_from_device(200) - will return 8 specific bytes if device is present
+        # get_parameter_from_device(201) - version
+        # get_parameter_from_device(202) - "device label" (serial number)
+        # There are more. I have not tested all.
+        # If the response format (and thus length) is known, pass
+        # response_length to read exactly that many bytes instead of whatever
+        # happens to have arrived.
+
+        b = [8, 0, 1, par]
+        self.send_packet(b)
+        if response_length is not None:
+            r = self.receive_frame(response_length)
+        else:
+            r = self.receive_packet()
+        return r
+        
+    def sync_time(self):
+        # Send the packet with the time information
+        self.send_packet(_time_packet())
+
+        # Receive the response packet
+        r = self.receive_packet()
+        if r is not None:
+            return True
+        return False
+
+    def send_command(self, com):
+        b = [8, 0, 11, com]
+        self.send_packet(b)
+        r = self.receive_packet()
+        if r:
+            return True
+        else:
+            return False
+    
+    @staticmethod
+    def _encode_marker(s):
+        # Encode once, truncate to 32 bytes, and replace '?' (both literal and
+        # the ASCII replacement character) with underscore at the bytes level -
+        # no round trip back through str
+        payload = str(s).encode('ascii', 'replace')[:32].replace(b'?', b'_')
+
+        # Splice the ASCII payload into the fixed packet header
+        b = bytearray(_MARKER_TEMPLATE)
+        b[20:20 + len(payload)] = payload
+        return bytes(b)
+
+    def send_marker(self, s):
+        self.send_packet(self._encode_marker(s))
+
+    # serializes all marker frames (with their CRCs) into one buffer and sends
+    # them in a single write, so a burst of markers costs one USB transaction
+    # instead of one per marker
+    def send_markers(self, messages):
+        frames = [_frame(self._encode_marker(m)) for m in messages]
+        if not frames:
+            return
+        try:
+            self.serialPort.write(b''.join(frames))
+        except serial.SerialException as e:
+            print(f"Serial port exception: {e}")
+        except Exception as e:
+            print(f"Exception occurred while sending packet: {e}")
+
+
+async def amain(port_name, command, argument=None, baudrate=38400, timeout=3):
+    """
+    Async variant of a single CLI command against one device. Commands use the
+    same names as the CLI flags (without the leading dashes), e.g. 'status',
+    'status-integer', 'send-marker'. Commands to independent devices can be
+    overlapped, so N devices cost max(per-device latency) instead of the sum:
+
+        async def poll_all(ports):
+            return await asyncio.gather(*(amain(p, 'status') for p in ports))
+
+    Requires the optional pyserial-asyncio package.
+    """
+    try:
+        import serial_asyncio
+    except ImportError:
+        print("The async interface requires pyserial-asyncio (pip install pyserial-asyncio).")
+        raise
+
+    reader, writer = await serial_asyncio.open_serial_connection(
+        url=port_name, baudrate=baudrate, bytesize=8, stopbits=1, parity='N')
+
+    # Send a packet and await the response; like the sync path, responses of
+    # known length are read exactly, others return whatever first arrives
+    async def transact(packet, response_length=None):
+        writer.write(_frame(packet))
+        try:
+            if response_length is not None:
+                return await asyncio.wait_for(reader.readexactly(response_length), timeout)
+            return await asyncio.wait_for(reader.read(1024), timeout)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+            return None
+
+    try:
+        if command == 'device-present':
+            data = await transact([8, 0, 1, 200], response_length=16)
+            return data is not None and data[:8] == b'\x0c\x00\x81\xc8AMS2'
+        elif command == 'label':
+            data = await transact([8, 0, 1, 202])
+            return str(data[4]) if data else None
+        elif command in ('status', 'status-integer'):
+            data = await transact([8, 0, 1, 100], response_length=16)
+            if not data:
+                return None
+            status = data[4]
+            return STATUS_LABELS[status] if command == 'status' else status
+        elif command == 'sync-time':
+            data = await transact(_time_packet())
+            return data is not None
+        elif command == 'start-recording':
+            writer.write(_frame([8, 0, 11, 5]))
+        elif command == 'stop-recording':
+            writer.write(_frame([8, 0, 11, 6]))
+        elif command == 'send-marker':
+            writer.write(_frame(AmsDevice._encode_marker(argument)))
+        else:
+            raise ValueError(f"Unknown command: {command}")
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+# Command table shared by the CLI, the daemon and the client: argparse
+# attribute name -> handler(device, flag value). The flag value is True for
+# boolean switches and the marker text for --send-marker. The wire name used
+# by the daemon protocol is the same with '-' instead of '_'. Adding a
+# command means adding a row here, not a branch.
+DISPATCH = {
+    'device_present': lambda device, value: device.is_device_present(),
+    'label': lambda device, value: device.get_device_label(),
+    'status': lambda device, value: device.get_device_status(True),
+    'status_integer': lambda device, value: device.get_device_status(),
+    'sync_time': lambda device, value: device.sync_time(),
+    'start_recording': lambda device, value: device.start_recording(),
+    'stop_recording': lambda device, value: device.stop_recording(),
+    'send_marker': lambda device, value: device.send_marker(value),
+}
+
+# Commands whose result is printed as '<port>,<result>'; the rest run silently
+_PRINTED_COMMANDS = ('device_present', 'label', 'status', 'status_integer')
+
+
+# Address used by the daemon/client modes: a Unix domain socket where the
+# platform supports one, otherwise a loopback TCP port
+_DAEMON_SOCKET_PATH = os.path.join(tempfile.gettempdir(), 'vuams.sock')
+_DAEMON_TCP_ADDRESS = ('127.0.0.1', 52599)
+
+
+def _daemon_socket():
+    if hasattr(socket, 'AF_UNIX'):
+        return socket.socket(socket.AF_UNIX, socket.SOCK_STREAM), _DAEMON_SOCKET_PATH
+    return socket.socket(socket.AF_INET, socket.SOCK_STREAM), _DAEMON_TCP_ADDRESS
+
+
+def _handle_daemon_request(device, port, request):
+    # Requests are single text lines: a command wire name, optionally followed
+    # by an argument (the marker text). Query commands reply '<port>,<result>'
+    # exactly like the CLI prints; action commands (which the CLI runs
+    # silently) reply 'OK', or 'FAIL' if the device reported failure.
+    command, _, argument = request.partition(' ')
+    name = command.replace('-', '_')
+    handler = DISPATCH.get(name)
+    if handler is None:
+        return f'{port},unknown command: {command}'
+    result = handler(device, argument if name == 'send_marker' else True)
+    if name in _PRINTED_COMMANDS:
+        return f'{port},{result}'
+    return 'FAIL' if result is False else 'OK'
+
+
+def run_daemon(device, port):
+    # Keep the serial port open and serve commands over a local socket, so
+    # repeated CLI invocations skip interpreter startup and serial open cost
+    sock, address = _daemon_socket()
+    if isinstance(address, str) and os.path.exists(address):
+        os.unlink(address)  # remove stale socket from a previous daemon
+    sock.bind(address)
+    sock.listen(1)
+    print(f"Daemon listening on {address}. Press Ctrl+C to stop.")
+    try:
+        while True:
+            conn, _ = sock.accept()
+            with conn:
+                request = conn.recv(1024).decode('utf-8', 'replace').strip()
+                if not request:
+                    continue
+                reply = _handle_daemon_request(device, port, request)
+                conn.sendall((reply + '\n').encode())
+    except KeyboardInterrupt:
+        print("Stopping daemon...")
+    finally:
+        sock.close()
+        if isinstance(address, str) and os.path.exists(address):
+            os.unlink(address)
+
+
+def send_daemon_request(request):
+    sock, address = _daemon_socket()
+    try:
+        sock.connect(address)
+    except (OSError, socket.error) as e:
+        print(f"Could not reach the daemon at {address}: {e}")
+        print("Start it first with: python vuams_serial.py --daemon")
+        exit(1)
+    with sock:
+        sock.sendall((request + '\n').encode())
+        reply = sock.recv(1024).decode('utf-8', 'replace').strip()
+    print(reply)
+
+
+def _client_request_from_args(args):
+    # Translate the selected command flag into its daemon wire line
+    for name in DISPATCH:
+        value = getattr(args, name)
+        if name == 'send_marker':
+            if value is not None:
+                return f'send-marker {value}'
+        elif value:
+            return name.replace('_', '-')
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Interact with a VU-AMS device connected to the computer via the AMS USB infared bridge.')
+    parser.add_argument('--port', help='Set a specific port (e.g. COM5). If not set, port will be determined automatically', type=str)
+    exclusive_group = parser.add_mutually_exclusive_group(required=True)
+    exclusive_group.add_argument('--device-present', action='store_true', help='Check if device is present')
+    exclusive_group.add_argument('--label', action='store_true', help='Get device label (serial number)')
+    exclusive_group.add_argument('--status', action='store_true', help='Get device status')
+    exclusive_group.add_argument('--status-integer', action='store_true', help='Get device status as an integer')
+    exclusive_group.add_argument('--sync-time', action='store_true', help='Set device time to system time')
+    exclusive_group.add_argument('--start-recording', action='store_true', help='Start recording')
+    exclusive_group.add_argument('--stop-recording', action='store_true', help='Stop recording')
+    exclusive_group.add_argument('--send-marker', metavar='MARKER', help='Send marker MARKER', type=str)
+    exclusive_group.add_argument('--daemon', action='store_true', help='Keep the serial port open and serve commands over a local socket')
+    parser.add_argument('--client', action='store_true', help='Forward the command to a running daemon instead of opening the port')
+
+    args = parser.parse_args()
+
+    # In client mode the daemon owns the serial port - just forward the command
+    if args.client:
+        if args.daemon:
+            print("--client cannot be combined with --daemon.")
+            exit(1)
+        request = _client_request_from_args(args)
+        if request is None:
+            print("No command to forward to the daemon. Use --client together with a command flag, e.g. --client --status.")
+            exit(1)
+        send_daemon_request(request)
+        exit(0)
+
+    # If port is not specified, find it automatically
+    port = args.port if args.port else AmsDevice.find_device_port()
+    if not port:
+        print("Could not find a compatible device port automatically.")
+        exit(1)
+
+    # Instantiate the device with the selected port
+    device = AmsDevice(port)
+    if device.connect():
+        try:
+            if args.daemon:
+                run_daemon(device, port)
+            else:
+                for name, handler in DISPATCH.items():
+                    value = getattr(args, name)
+                    if value:
+                        result = handler(device, value)
+                        if name in _PRINTED_COMMANDS:
+                            print(f'{port},{result}')
+                        break
+        finally:
+            device.disconnect()
+            exit(0)
+    else:
+        print("Failed to connect to the device.")
+        exit(1)
+
+if __name__ == '__main__':
+    main()